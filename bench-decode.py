@@ -0,0 +1,87 @@
+import argparse
+import json
+import tracemalloc
+from datetime import date, timedelta
+from time import perf_counter
+
+from retriever import payloads
+from retriever.archive import ArchiveReader
+from retriever.fake_fandango import synthetic_payload
+from retriever.fandango_json import _load_schedule
+from retriever.theaters import THEATER_NAMES
+
+
+def _stdlib_full(payload):
+    # What requests' response.json() did: decode to text, then decode it all.
+    return json.loads(payload.decode("utf-8"))
+
+DECODERS = {"stdlib full (baseline)": _stdlib_full, "stdlib lean": payloads.decode_lean_stdlib}
+if payloads.orjson:
+    DECODERS.update({"orjson full": payloads.orjson.loads, "orjson lean": payloads.decode_lean_orjson})
+
+
+def _load_payloads(args):
+    if args.archive:
+        with ArchiveReader(args.archive) as archive:
+            return [(theater, archive.read(theater, day)) for theater in archive.theaters() for day in archive.days(theater)]
+
+    start = date.today()
+    return [
+        (theater, json.dumps(synthetic_payload(theater, start + timedelta(days=offset), args.movies, args.padding_kb)).encode("utf-8"))
+        for theater in THEATER_NAMES for offset in range(args.days)
+    ]
+
+def _time(func, theater_payloads, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        for theater, payload in theater_payloads:
+            func(theater, payload)
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+def _memory(decoder, theater_payloads):
+    # Peak while decoding one payload at a time, and what the decoded result keeps.
+    peak = 0
+    retained = 0
+    for _, payload in theater_payloads:
+        tracemalloc.start()
+        decoded = decoder(payload)
+        current, payload_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = max(peak, payload_peak)
+        retained = max(retained, current)
+        del decoded
+    return peak, retained
+
+
+def main(args):
+    theater_payloads = _load_payloads(args)
+    total_mb = sum(len(payload) for _, payload in theater_payloads) / 2 ** 20
+    print(f"{len(theater_payloads)} payloads, {total_mb:.1f} MiB, best of {args.repeats} runs\n")
+
+    rows = []
+    for name, decoder in DECODERS.items():
+        decode_time = _time(lambda theater, payload: decoder(payload), theater_payloads, args.repeats)
+        parse_time = _time(lambda theater, payload: _load_schedule(decoder(payload), theater), theater_payloads, args.repeats)
+        peak, retained = _memory(decoder, theater_payloads)
+        rows.append((name, decode_time, parse_time, peak, retained))
+
+    baseline = rows[0]
+    print(f"{'decoder':<24}{'decode ms':>11}{'speedup':>9}{'+parse ms':>11}{'peak KiB':>11}{'kept KiB':>11}")
+    for name, decode_time, parse_time, peak, retained in rows:
+        print(f"{name:<24}{decode_time * 1000:>11.1f}{baseline[1] / decode_time:>8.2f}x{parse_time * 1000:>11.1f}"
+              f"{peak / 1024:>11.0f}{retained / 1024:>11.0f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare payload decoding time and memory across decoders.")
+    parser.add_argument("--archive", help="Benchmark the payloads of a snapshot archive, instead of synthetic ones.")
+    parser.add_argument("--days", type=int, default=7, help="Synthetic days per theater.")
+    parser.add_argument("--movies", type=int, default=20, help="Movies per synthetic payload.")
+    parser.add_argument("--padding-kb", type=int, default=200, help="Unread data per synthetic payload.")
+    parser.add_argument("--repeats", type=int, default=5)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+# The harness always writes to a throwaway SQLite database, never the real one.
+os.environ.pop("DATABASE_URL", None)
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="load-test-"), "showtimes.db")
+
+from retriever import fandango_json
+from retriever.fake_fandango import add_config_args, config_from_args, start_server, summarize
+from retriever.movie_times_lib import collect_all_schedules, db_update_theaters
+from retriever.render import render_ics, render_plaintext
+from retriever.schedule import Filter, date_range_str_parser
+from retriever.theaters import THEATER_NAMES
+
+
+def _db_flow(theaters, date_range):
+    db_update_theaters(theaters, date_range)
+
+def _email_flow(theaters, date_range):
+    # Everything up to sending; the rendered attachments are thrown away.
+    for schedule in collect_all_schedules(theaters, date_range, Filter.empty()).values():
+        render_plaintext(schedule)
+        render_ics(schedule)
+
+FLOWS = {"db": _db_flow, "email": _email_flow}
+
+
+def main(args):
+    server, base_url = start_server(config_from_args(args))
+    fandango_json.FANDANGO_BASE_URL = base_url
+    fandango_json.RETRY_BACKOFF = args.retry_backoff
+
+    theaters = THEATER_NAMES[:args.theaters]
+    date_range = date_range_str_parser(args.date)
+
+    print(f"Fake napi at {base_url}, database at {os.environ['SQLITE_PATH']}")
+    for flow in args.flows or FLOWS:
+        server.stats.clear()
+        start = perf_counter()
+        for _ in range(args.iterations):
+            FLOWS[flow](theaters, date_range)
+        results = summarize(server.stats, perf_counter() - start)
+
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(results["statuses"].items()))
+        print(f"{flow}: {results['requests']} requests ({statuses}) in {results['wall_time_s']:.2f}s, "
+              f"{results['requests_per_sec']:.1f} req/s, p50 {results['p50_ms']:.1f}ms, p99 {results['p99_ms']:.1f}ms")
+
+    server.shutdown()
+    server.server_close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the db and email flows end to end against a local fake napi.")
+    parser.add_argument("--flow", action="append", choices=sorted(FLOWS), dest="flows", help="Defaults to every flow.")
+    parser.add_argument("--theaters", type=int, default=len(THEATER_NAMES), help="How many theaters to fetch.")
+    parser.add_argument("--date", default="next movie week")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--retry-backoff", type=float, default=0.1, help="Base seconds between client retries.")
+    add_config_args(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,19 +1,28 @@
 import argparse
 import base64
+import json
 import os
+import traceback
+from datetime import date, datetime, time, timedelta, timezone
+from functools import partial
+from time import sleep
 
 from ical.calendar import Calendar
 from ical.calendar_stream import IcsCalendarStream
 from ical.event import Event
 from mailtrap import Address, Attachment, Mail, MailtrapClient
 
-from retriever import db
+from retriever import api, backfill, db, retention, snapshots
+from retriever.archive import ArchiveReader, ArchiveWriter
 from retriever.fandango_json import load_schedules_by_day
-from retriever.schedule import Filter, FullSchedule, ParseError, \
+from retriever.search import ShowtimeIndex
+from retriever.schedule import SYSTEM_TZNAME, Filter, FullSchedule, ParseError, \
         date_range_str_parser as _raw_date_parser, time_str_parser as _raw_time_parser
-from retriever.movie_times_lib import collect_schedule, db_showtime_updates, \
-        email_theater_schedules, send_deletion_report
+from retriever.movie_times_lib import collect_all_schedules, collect_schedule, db_store_schedules, \
+        db_update_theaters, email_rendered_schedules, email_theater_schedules, fan_out, record_payloads, \
+        send_deletion_report, write_schedule_files
 from retriever.theaters import THEATER_NAMES
+from retriever.utils import offset_timezone
 
 
 def _wrap_parser(parser):
@@ -28,34 +37,149 @@ date_range_str_parser = _wrap_parser(_raw_date_parser)
 time_str_parser = _wrap_parser(_raw_time_parser)
 
 
-def db_main(theater, date_range, deletion_report=True):
-    schedule_range = collect_schedule(theater, None, date_range, Filter.empty(), False)
-    showtimes = db.store_showtimes(theater, schedule_range)
-    deleted_showtimes = db_showtime_updates(theater, date_range, showtimes)
+def db_main(theaters, date_range, deletion_report=True, archive=None, detect_deletions=True):
+    deleted_showtimes = db_update_theaters(theaters, date_range, archive=archive, detect_deletions=detect_deletions)
     if deletion_report and deleted_showtimes:
-        send_deletion_report(deleted_showtimes)
+        send_deletion_report(datetime.now(timezone.utc))
 
-def email_main(dates, theaters, sender, sender_name, receiver):
+def email_main(dates, theaters, sender, sender_name, receiver, from_db=False):
     theaters = theaters or THEATER_NAMES
 
-    theaters_to_schedule = {theater: collect_schedule(theater, None, dates, Filter.empty(), True) for theater in theaters}
-    email_theater_schedules(theaters_to_schedule, dates, sender, sender_name, receiver)
+    if from_db:
+        theaters_to_rendered = {theater: snapshots.load_rendered_schedule(theater, dates) for theater in theaters}
+        theaters_to_rendered = {theater: rendered for theater, rendered in theaters_to_rendered.items() if rendered}
+        email_rendered_schedules(theaters_to_rendered, dates, sender, sender_name, receiver)
+    else:
+        theaters_to_schedule = {theater: collect_schedule(theater, None, dates, Filter.empty(), True) for theater in theaters}
+        email_theater_schedules(theaters_to_schedule, dates, sender, sender_name, receiver)
 
-def cli_main(theater, filepath, date_range, name_only, date_only, filter_params):
-    schedule_range = collect_schedule(theater, filepath, date_range, filter_params, False)
+def cli_main(theater, filepath, date_range, name_only, date_only, filter_params, from_db=False):
+    schedule_range = collect_schedule(theater, filepath, date_range, filter_params, False, from_db=from_db)
     
     print(end="\n\n")
     print(schedule_range.output(name_only, date_only))
     print(f"\n- {len(schedule_range)} showtimes")
 
+def run_main(theaters, date_range, sinks, deletion_report, sender, sender_name, receiver, output_dir):
+    theaters_to_schedule = collect_all_schedules(theaters, date_range, Filter.empty())
+
+    def _db_sink():
+        deleted_showtimes = db_store_schedules(theaters_to_schedule, date_range)
+        if deletion_report and deleted_showtimes:
+            send_deletion_report(datetime.now(timezone.utc))
+
+    sink_funcs = {
+        "db": _db_sink,
+        "email": partial(email_theater_schedules, theaters_to_schedule, date_range, sender, sender_name, receiver),
+        "plaintext": partial(write_schedule_files, theaters_to_schedule, output_dir, "plaintext"),
+        "json": partial(write_schedule_files, theaters_to_schedule, output_dir, "json")
+    }
+    _, failures = fan_out({sink: sink_funcs[sink] for sink in sinks})
+
+    for sink, exc in failures.items():
+        print(f"[ERROR] The {sink} sink failed:")
+        traceback.print_exception(exc)
+    if failures:
+        raise SystemExit(1)
+
+def record_main(archive_path, theaters, date_range):
+    with ArchiveWriter(archive_path) as archive_writer:
+        payload_count = record_payloads(archive_writer, theaters, date_range)
+    print(f"Recorded {payload_count} payloads to {archive_path}")
+
+def replay_main(archive_path, theaters, start, end, to, detect_deletions, deletion_report):
+    with ArchiveReader(archive_path) as archive:
+        theaters = theaters or archive.theaters()
+        days = archive.days()
+        if not days:
+            print("[WARN] The archive is empty.")
+            return
+
+        tz = offset_timezone(SYSTEM_TZNAME)
+        date_range = tuple(datetime.combine(day, time(), tz) for day in (start or days[0], end or days[-1]))
+
+        if to == "db":
+            # Recorded payloads are usually older than the database, so by
+            # default they are only stored, never used to remove showtimes.
+            db_main(theaters, date_range, deletion_report, archive, detect_deletions)
+        else:
+            for theater, schedule_range in collect_all_schedules(theaters, date_range, Filter.empty(), archive=archive).items():
+                print(f"{theater}\n{schedule_range.output(False, False)}\n\n- {len(schedule_range)} showtimes\n")
+
+def maintenance_main(keep_days, keep_deleted_days, archive_dir, compact):
+    results = retention.run_maintenance(keep_days, keep_deleted_days, archive_dir=archive_dir, compact=compact)
+    print(f"Archived {results['archived_showtimes']} showtimes and {results['archived_deletions']} deletions to {archive_dir}")
+    print(f"Removed {results['removed_snapshots']} snapshots")
+    if results["created_partitions"]:
+        print(f"Created partitions: {', '.join(results['created_partitions'])}")
+
+def search_main(title, prefix, fuzzy, fmts, date_range, theaters, live, archive_dir):
+    theaters = theaters or THEATER_NAMES
+    if live:
+        index = ShowtimeIndex.from_live(theaters, date_range)
+    else:
+        index = ShowtimeIndex.from_db(theaters, date_range, archive_dir=archive_dir)
+
+    days = [date_range[0].date() + timedelta(days=offset) for offset in range((date_range[1] - date_range[0]).days + 1)]
+    showtimes = index.search(title, fmts, days, theaters, prefix=prefix, fuzzy=fuzzy)
+    for showtime in showtimes:
+        start = datetime.fromisoformat(showtime["start_time"])
+        print(f"{start.strftime('%a %B %d %H:%M')}  {showtime['theater']}  {showtime['title']} ({showtime['format']})")
+    print(f"\n- {len(showtimes)} showtimes")
+
+def backfill_main(job, theaters, date_range, workers, batch_size):
+    job = job or backfill.default_job_name(date_range)
+    results = backfill.run_backfill(job, theaters, date_range, workers=workers, batch_size=batch_size)
+    print(f"Backfill {job}: stored {results['stored_showtimes']} showtimes from {results['stored_shards']} shards, "
+          f"skipped {results['skipped_shards']} already complete")
+    if results["failed_shards"]:
+        print(f"[WARN] {len(results['failed_shards'])} shards failed; rerun with --job {job} to retry them.")
+    if results["empty_shards"]:
+        print(f"[WARN] {len(results['empty_shards'])} shards had no schedule; rerun with --job {job} to fetch them again.")
+
+def changes_main(after, limit, follow, interval):
+    while True:
+        changes = db.load_changes(after, limit)
+        for change in changes:
+            print(json.dumps(change, sort_keys=True), flush=True)
+        if changes:
+            after = changes[-1]["seq"]
+
+        if len(changes) < limit:
+            if not follow:
+                break
+            sleep(interval)
+
 def main(args):
     if args.output == "cli":
         filter_params = Filter(args.earliest, args.latest, args.movie, args.not_movie, args.format, args.not_format)
-        cli_main(args.theater, args.filepath, args.date_range, args.name_only, args.date_only, filter_params)
+        cli_main(args.theater, args.filepath, args.date_range, args.name_only, args.date_only, filter_params, args.from_db)
     elif args.output == "email":
-        email_main(args.date_range, args.theaters, args.frm, args.from_name, args.to)
+        email_main(args.date_range, args.theaters, args.frm, args.from_name, args.to, args.from_db)
     elif args.output == "db":
-        db_main(args.theater, args.date_range, args.deletion_report)
+        theaters = THEATER_NAMES if args.all_theaters else (args.theaters or ["AMC Methuen"])
+        db_main(theaters, args.date_range, args.deletion_report)
+    elif args.output == "run":
+        theaters = THEATER_NAMES if args.all_theaters else (args.theaters or THEATER_NAMES)
+        run_main(theaters, args.date_range, set(args.sinks), args.deletion_report, args.frm, args.from_name, args.to, args.output_dir)
+    elif args.output == "record":
+        theaters = THEATER_NAMES if args.all_theaters else (args.theaters or ["AMC Methuen"])
+        record_main(args.archive, theaters, args.date_range)
+    elif args.output == "replay":
+        theaters = THEATER_NAMES if args.all_theaters else args.theaters
+        replay_main(args.archive, theaters, args.start, args.end, args.to, args.detect_deletions, args.deletion_report)
+    elif args.output == "backfill":
+        theaters = args.theaters or THEATER_NAMES
+        backfill_main(args.job, theaters, args.date_range, args.workers, args.batch_size)
+    elif args.output == "changes":
+        changes_main(args.after, args.limit, args.follow, args.interval)
+    elif args.output == "search":
+        archive_dir = args.archive_dir if args.include_archive else None
+        search_main(args.title, args.prefix, args.fuzzy, args.formats, args.date_range, args.theaters, args.live, archive_dir)
+    elif args.output == "maintenance":
+        maintenance_main(args.keep_days, args.keep_deleted_days, args.archive_dir, args.compact)
+    elif args.output == "serve":
+        api.serve(args.host, args.port, args.cache_size, args.archive_dir if args.include_archive else None)
 
 
 def parse_args():
@@ -69,6 +193,7 @@ def parse_args():
     input_group = cli_parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument("--filepath")
     input_group.add_argument("--date", type=date_range_str_parser, dest="date_range")
+    cli_parser.add_argument("--from-db", action="store_true", help="Read the schedule from the database instead of fetching it.")
     cli_parser.add_argument("--name-only", action="store_true")
     cli_parser.add_argument("--date-only", action="store_true")
     cli_parser.add_argument("--earliest", "-e", type=time_str_parser)
@@ -85,14 +210,106 @@ def parse_args():
     email_parser.add_argument("--from", dest="frm")
     email_parser.add_argument("--from-name", default="Test Movie Sender")
     email_parser.add_argument("--to")
+    email_parser.add_argument("--from-db", action="store_true", help="Send the stored schedule snapshots instead of fetching.")
 
     db_parser = subparsers.add_parser("db", help="Output the result to a database.")
     db_parser.set_defaults(output="db")
-    db_parser.add_argument("--theater", default="AMC Methuen", choices=sorted(THEATER_NAMES))
+    theater_group = db_parser.add_mutually_exclusive_group()
+    theater_group.add_argument("--theater", action="append", choices=sorted(THEATER_NAMES), dest="theaters")
+    theater_group.add_argument("--all-theaters", action="store_true")
     db_parser.add_argument("--date", type=date_range_str_parser, dest="date_range", default="next movie week")
     db_parser.add_argument("--deletion-report", action="store_true")
 
-    return parser.parse_args()
+    run_parser = subparsers.add_parser("run", help="Fetch once, then output to several sinks at the same time.")
+    run_parser.set_defaults(output="run")
+    run_theater_group = run_parser.add_mutually_exclusive_group()
+    run_theater_group.add_argument("--theater", action="append", choices=sorted(THEATER_NAMES), dest="theaters",
+        help="Defaults to every theater.")
+    run_theater_group.add_argument("--all-theaters", action="store_true")
+    run_parser.add_argument("--date", type=date_range_str_parser, dest="date_range", default="next movie week")
+    run_parser.add_argument("--sink", action="append", choices=("db", "email", "plaintext", "json"), dest="sinks", required=True)
+    run_parser.add_argument("--deletion-report", action="store_true")
+    run_parser.add_argument("--from", dest="frm")
+    run_parser.add_argument("--from-name", default="Test Movie Sender")
+    run_parser.add_argument("--to")
+    run_parser.add_argument("--output-dir", default="schedules", help="Where the plaintext and json sinks write.")
+
+    record_parser = subparsers.add_parser("record", help="Save the raw showtimes payloads to a snapshot archive.")
+    record_parser.set_defaults(output="record")
+    record_parser.add_argument("--archive", required=True)
+    record_theater_group = record_parser.add_mutually_exclusive_group()
+    record_theater_group.add_argument("--theater", action="append", choices=sorted(THEATER_NAMES), dest="theaters")
+    record_theater_group.add_argument("--all-theaters", action="store_true")
+    record_parser.add_argument("--date", type=date_range_str_parser, dest="date_range", default="next movie week")
+
+    replay_parser = subparsers.add_parser("replay", help="Load the payloads from a snapshot archive, instead of fetching them.")
+    replay_parser.set_defaults(output="replay")
+    replay_parser.add_argument("--archive", required=True)
+    replay_theater_group = replay_parser.add_mutually_exclusive_group()
+    replay_theater_group.add_argument("--theater", action="append", choices=sorted(THEATER_NAMES), dest="theaters")
+    replay_theater_group.add_argument("--all-theaters", action="store_true")
+    replay_parser.add_argument("--start", type=date.fromisoformat, help="Defaults to the first day in the archive.")
+    replay_parser.add_argument("--end", type=date.fromisoformat, help="Defaults to the last day in the archive.")
+    replay_parser.add_argument("--to", choices=("plaintext", "db"), default="plaintext")
+    replay_parser.add_argument("--detect-deletions", action="store_true",
+        help="With --to db, also remove stored future showtimes missing from the archive.")
+    replay_parser.add_argument("--deletion-report", action="store_true", help="Requires --detect-deletions.")
+
+    backfill_parser = subparsers.add_parser("backfill", help="Load a long date range into the database across processes, resumably.")
+    backfill_parser.set_defaults(output="backfill")
+    backfill_parser.add_argument("--theater", action="append", choices=sorted(THEATER_NAMES), dest="theaters",
+        help="Defaults to every theater.")
+    backfill_parser.add_argument("--date", type=date_range_str_parser, dest="date_range", required=True)
+    backfill_parser.add_argument("--job", help="Checkpoint name to resume under. Defaults to a new one derived from the dates and today's date.")
+    backfill_parser.add_argument("--workers", type=int, help="Defaults to the number of CPUs.")
+    backfill_parser.add_argument("--batch-size", type=int, default=20, help="Shards stored per transaction.")
+
+    changes_parser = subparsers.add_parser("changes", help="Stream the showtime change feed as NDJSON.")
+    changes_parser.set_defaults(output="changes")
+    changes_parser.add_argument("--after", type=int, default=0, help="Only output changes with a greater seq.")
+    changes_parser.add_argument("--limit", type=int, default=1000, help="Changes read per query.")
+    changes_parser.add_argument("--follow", action="store_true", help="Keep polling for new changes.")
+    changes_parser.add_argument("--interval", type=float, default=5, help="Seconds between polls when following.")
+
+    search_parser = subparsers.add_parser("search", help="Find where a movie or format is showing across theaters.")
+    search_parser.set_defaults(output="search")
+    search_parser.add_argument("--title", "-m")
+    search_parser.add_argument("--prefix", action="store_true", help="Match any title with a run of words starting with the given text.")
+    search_parser.add_argument("--fuzzy", action="store_true", help="Match similarly spelled titles.")
+    search_parser.add_argument("--format", "-f", action="append", dest="formats")
+    search_parser.add_argument("--date", type=date_range_str_parser, dest="date_range", default="movie week")
+    search_parser.add_argument("--theater", action="append", choices=sorted(THEATER_NAMES), dest="theaters")
+    search_parser.add_argument("--live", action="store_true", help="Fetch the schedules instead of reading the database.")
+    search_parser.add_argument("--include-archive", action="store_true", help="Also search the showtimes moved out by maintenance.")
+    search_parser.add_argument("--archive-dir", default=os.getenv("SHOWTIMES_ARCHIVE_DIR", retention.DEFAULT_ARCHIVE_DIR))
+
+    maintenance_parser = subparsers.add_parser("maintenance", help="Archive old showtime history and compact the database.")
+    maintenance_parser.set_defaults(output="maintenance")
+    maintenance_parser.add_argument("--keep-days", type=int, default=int(os.getenv("SHOWTIMES_KEEP_DAYS", 90)),
+        help="How many days of past showtimes to keep in the database.")
+    maintenance_parser.add_argument("--keep-deleted-days", type=int, default=int(os.getenv("DELETED_SHOWTIMES_KEEP_DAYS", 365)),
+        help="How many days of deletions to keep in the database.")
+    maintenance_parser.add_argument("--archive-dir", default=os.getenv("SHOWTIMES_ARCHIVE_DIR", retention.DEFAULT_ARCHIVE_DIR))
+    maintenance_parser.add_argument("--no-compact", action="store_false", dest="compact")
+
+    serve_parser = subparsers.add_parser("serve", help="Serve the stored showtimes as read-only JSON over HTTP.")
+    serve_parser.set_defaults(output="serve")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--cache-size", type=int, default=256)
+    serve_parser.add_argument("--include-archive", action="store_true", help="Also serve the showtimes moved out by maintenance.")
+    serve_parser.add_argument("--archive-dir", default=os.getenv("SHOWTIMES_ARCHIVE_DIR", retention.DEFAULT_ARCHIVE_DIR))
+
+    args = parser.parse_args()
+    if getattr(args, "output", None) == "cli" and args.from_db and not args.date_range:
+        parser.error("--from-db requires --date")
+    if getattr(args, "output", None) == "changes" and args.limit < 1:
+        parser.error("--limit must be at least 1")
+    if getattr(args, "output", None) == "search" and args.live and args.include_archive:
+        parser.error("--include-archive cannot be combined with --live")
+    if getattr(args, "output", None) == "replay" and args.deletion_report and not args.detect_deletions:
+        parser.error("--deletion-report requires --detect-deletions")
+    return args
 
 if __name__ == "__main__":
     main(parse_args())
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from retriever import db, retention
+from retriever.theaters import THEATER_NAMES, timezone
+
+
+class RequestError(ValueError):
+    pass
+
+
+class ResponseCache:
+    """LRU cache of encoded responses, tagged with the data version they were built from."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def put(self, key, version, etag, body):
+        with self._lock:
+            self._entries[key] = (version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise RequestError(f"Expected {name} in ISO format (YYYY-MM-DD).")
+
+def _single(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+def _showtimes_response(params, archive_dir=None):
+    theaters = params.get("theater") or list(THEATER_NAMES)
+    unknown_theaters = [theater for theater in theaters if theater not in THEATER_NAMES]
+    if unknown_theaters:
+        raise RequestError(f"Unknown theater(s): {', '.join(unknown_theaters)}")
+
+    start = _parse_date(_single(params, "start", date.today().isoformat()), "start")
+    end = _parse_date(_single(params, "end", start.isoformat()), "end")
+    if end < start:
+        raise RequestError("The end date cannot come before the start date.")
+
+    title = _single(params, "title")
+    fmt = _single(params, "format")
+
+    showtimes = []
+    for theater in theaters:
+        tz = timezone(theater)
+        # The end date is inclusive, but load_showtimes is not.
+        first_time = datetime.combine(start, time(), tz)
+        last_time = datetime.combine(end + timedelta(days=1), time(), tz)
+        theater_showtimes = db.load_showtimes(theater, first_time, last_time, title, fmt=fmt)
+        if archive_dir:
+            theater_showtimes = sorted(
+                retention.load_archived_showtimes(theater, first_time, last_time, title, fmt=fmt, archive_dir=archive_dir)
+                + theater_showtimes,
+                key=lambda showtime: showtime["title"]
+            )
+        showtimes.extend(theater_showtimes)
+
+    last_update = db.theaters_last_update()
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "last_update": {theater: last_update.get(theater) for theater in theaters},
+        "showtimes": showtimes
+    }
+
+def _theaters_response(params, archive_dir=None):
+    last_update = db.theaters_last_update()
+    return {theater: last_update.get(theater) for theater in THEATER_NAMES}
+
+ROUTES = {
+    "/showtimes": _showtimes_response,
+    "/theaters": _theaters_response
+}
+
+
+class ScheduleRequestHandler(BaseHTTPRequestHandler):
+    cache = None
+    archive_dir = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path.rstrip("/"))
+        if not route:
+            self._send_json(404, {"error": f"Unknown path: {url.path}"})
+            return
+
+        params = parse_qs(url.query)
+        # Omitted dates default to today, so the same query means something
+        # else once the day turns over.
+        cache_key = (url.path.rstrip("/"), date.today(), tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        version = db.data_version()
+
+        cached = self.cache.get(cache_key, version)
+        if cached:
+            etag, body = cached
+        else:
+            try:
+                response = route(params, self.archive_dir)
+            except RequestError as exc:
+                self._send_json(400, {"error": str(exc)})
+                return
+
+            body = json.dumps(response, sort_keys=True).encode("utf-8")
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            self.cache.put(cache_key, version, etag, body)
+
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self._send_body(200, body, etag)
+
+    def _send_json(self, status, response):
+        self._send_body(status, json.dumps(response).encode("utf-8"))
+
+    def _send_body(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host, port, cache_size, archive_dir=None):
+    """Serves the stored showtimes, along with those retention archived to archive_dir, if given."""
+    cache = ResponseCache(cache_size)
+    db.add_commit_listener(cache.clear)
+
+    handler = type("CachedScheduleRequestHandler", (ScheduleRequestHandler, ), {"cache": cache, "archive_dir": archive_dir})
+    with ThreadingHTTPServer((host, port), handler) as server:
+        print(f"Serving showtimes on http://{host}:{port}")
+        server.serve_forever()
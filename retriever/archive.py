@@ -0,0 +1,116 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import date
+
+
+# Layout: MAGIC, then each payload compressed on its own, then the compressed
+# JSON index of (theater, date) -> (offset, length), then the footer giving the
+# position of the index. Any one payload can be read from a memory map without
+# touching the others.
+MAGIC = b"MSRARCH1"
+FOOTER = struct.Struct(f"<QQ{len(MAGIC)}s")
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def _key(theater, day):
+    return f"{theater}|{day.isoformat()}"
+
+
+class ArchiveWriter:
+    def __init__(self, path, *, level=6):
+        self.path = path
+        self.level = level
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._index = {}
+
+    def add(self, theater, day, payload):
+        compressed = zlib.compress(payload, self.level)
+        self._index[_key(theater, day)] = {
+            "theater": theater,
+            "date": day.isoformat(),
+            "offset": self._file.tell(),
+            "length": len(compressed)
+        }
+        self._file.write(compressed)
+
+    def close(self):
+        index_offset = self._file.tell()
+        index_bytes = zlib.compress(json.dumps(list(self._index.values())).encode("utf-8"), self.level)
+        self._file.write(index_bytes)
+        self._file.write(FOOTER.pack(index_offset, len(index_bytes), MAGIC))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+class ArchiveReader:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ArchiveError(f"{path} is empty, not a snapshot archive.")
+
+        if len(self._map) < len(MAGIC) + FOOTER.size or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ArchiveError(f"{path} is not a snapshot archive.")
+
+        index_offset, index_length, footer_magic = FOOTER.unpack(self._map[-FOOTER.size:])
+        if footer_magic != MAGIC:
+            self.close()
+            raise ArchiveError(f"{path} is truncated or was not closed properly.")
+
+        entries = json.loads(zlib.decompress(self._map[index_offset:index_offset + index_length]))
+        self._index = {_key(entry["theater"], date.fromisoformat(entry["date"])): entry for entry in entries}
+
+    def __contains__(self, theater_day):
+        return _key(*theater_day) in self._index
+
+    def theaters(self):
+        return sorted({entry["theater"] for entry in self._index.values()})
+
+    def days(self, theater=None):
+        return sorted({
+            date.fromisoformat(entry["date"])
+            for entry in self._index.values()
+            if theater is None or entry["theater"] == theater
+        })
+
+    def read(self, theater, day):
+        entry = self._index.get(_key(theater, day))
+        if not entry:
+            return None
+        return zlib.decompress(self._map[entry["offset"]:entry["offset"] + entry["length"]])
+
+    def close(self):
+        if getattr(self, "_map", None):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
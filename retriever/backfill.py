@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from retriever import db
+from retriever.fandango_json import load_day_schedule
+
+
+def _shards(theaters, date_range):
+    current_date, end_date = date_range
+    while current_date <= end_date:
+        for theater in theaters:
+            yield theater, current_date
+        current_date += timedelta(days=1)
+
+def default_job_name(date_range):
+    # Includes the run date, so that a later backfill of the same dates
+    # fetches them again instead of resuming a finished job.
+    return f"{date_range[0].date().isoformat()}:{date_range[1].date().isoformat()}@{date.today().isoformat()}"
+
+
+def run_backfill(job, theaters, date_range, *, workers=None, batch_size=20):
+    """Fetches and parses every (theater, day) shard across a process pool, storing them from this process.
+
+    Shards are written in batches, each checkpointed in the same transaction,
+    so rerunning an interrupted job skips whatever it already stored. Shards
+    without a schedule aren't checkpointed, so a rerun fetches them again.
+    """
+    completed = db.load_completed_shards(job)
+    shards = list(_shards(theaters, date_range))
+    pending = [(theater, showdate) for theater, showdate in shards if (theater, showdate.date().isoformat()) not in completed]
+    skipped_count = len(shards) - len(pending)
+
+    stored_shards = 0
+    stored_showtimes = 0
+    failed = []
+    empty = []
+    batch = []
+
+    def _flush():
+        nonlocal stored_shards, stored_showtimes
+        stored_showtimes += db.store_backfill_shards(job, batch)
+        stored_shards += len(batch)
+        batch.clear()
+        print(f"{stored_shards}/{len(pending)} shards stored", flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {executor.submit(load_day_schedule, theater, showdate): (theater, showdate) for theater, showdate in pending}
+        # The workers only fetch and parse. This process is the single writer,
+        # taking their results in the order they finish.
+        for future in as_completed(futures):
+            theater, showdate = futures[future]
+            try:
+                schedule = future.result()
+            except Exception as exc:
+                print(f"[WARN] Failed to load {theater} on {showdate.date().isoformat()}: {exc}")
+                failed.append((theater, showdate))
+                continue
+            if schedule is None:
+                empty.append((theater, showdate))
+                continue
+
+            batch.append((theater, showdate.date(), schedule))
+            if len(batch) >= batch_size:
+                _flush()
+
+    if batch:
+        _flush()
+
+    return {
+        "stored_shards": stored_shards,
+        "stored_showtimes": stored_showtimes,
+        "skipped_shards": skipped_count,
+        "failed_shards": failed,
+        "empty_shards": empty
+    }
@@ -1,11 +1,32 @@
 import os
-from datetime import datetime, timezone
+import threading
+from datetime import date, datetime, timedelta, timezone
 import sqlite3
 
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
 
+SQLITE_PATH = os.getenv("SQLITE_PATH", "showtimes.db")
+# How long a connection waits on another's lock before "database is locked".
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 30))
+SQLITE_PRAGMAS = (
+    # WAL makes a commit durable at checkpoints rather than on every
+    # transaction, which NORMAL reflects without risking corruption.
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY"
+)
+
+_SQLITE_CONNECTIONS = threading.local()
+
+def _sqlite_connect(**kwargs):
+    db = sqlite3.connect(SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=256, **kwargs)
+    for pragma in SQLITE_PRAGMAS:
+        db.execute(pragma)
+    return db
+
 def _connect():
     global _DATETIME, _PH
     database_url = os.getenv('DATABASE_URL')
@@ -16,19 +37,84 @@ def _connect():
     else:
         _PH = "?"
         _DATETIME = ""
-        db = sqlite3.connect("showtimes.db")
-        db.row_factory = sqlite3.Row
+
+        # Each thread keeps its connection, and with it the prepared statement
+        # cache. A forked process opens its own rather than sharing the parent's.
+        db = getattr(_SQLITE_CONNECTIONS, "db", None)
+        if db is None or _SQLITE_CONNECTIONS.pid != os.getpid():
+            db = _sqlite_connect()
+            db.row_factory = sqlite3.Row
+            _SQLITE_CONNECTIONS.db = db
+            _SQLITE_CONNECTIONS.pid = os.getpid()
         return db
 
-def load_showtimes(theater, first_time, last_time, title=None, *, clean=True):
+def _release(db):
+    if isinstance(db, sqlite3.Connection):
+        if db.in_transaction:
+            db.rollback()
+    else:
+        db.close()
+
+
+_COMMIT_LISTENERS = []
+_COMMIT_GENERATION = 0
+_VERSION_DB = None
+_VERSION_LOCK = threading.Lock()
+
+def add_commit_listener(listener):
+    """Registers a callable to run after this process commits showtime changes."""
+    _COMMIT_LISTENERS.append(listener)
+
+def _notify_commit():
+    global _COMMIT_GENERATION
+    _COMMIT_GENERATION += 1
+    for listener in _COMMIT_LISTENERS:
+        listener()
+
+def data_version():
+    """Returns a token which changes whenever showtimes are committed.
+
+    Commits from other processes are picked up as well. SQLite tracks them with
+    PRAGMA data_version, which is only meaningful on a long-lived connection,
+    so one is kept around for the purpose. Postgres keeps one too, to spare
+    every check a new connection.
+    """
+    global _VERSION_DB
+    database_url = os.getenv('DATABASE_URL')
+    with _VERSION_LOCK:
+        if database_url:
+            for attempt in range(2):
+                if _VERSION_DB is None or _VERSION_DB.closed:
+                    _VERSION_DB = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+                    _VERSION_DB.autocommit = True
+                try:
+                    with _VERSION_DB.cursor() as cur:
+                        cur.execute("SELECT MAX(seq) AS last_seq FROM showtime_changes")
+                        version = cur.fetchone()["last_seq"]
+                    break
+                except psycopg2.OperationalError:
+                    # The server dropped the connection; reconnect once.
+                    _VERSION_DB.close()
+                    if attempt:
+                        raise
+        else:
+            if _VERSION_DB is None:
+                _VERSION_DB = _sqlite_connect(check_same_thread=False)
+            version = _VERSION_DB.execute("PRAGMA data_version").fetchone()[0]
+    return (_COMMIT_GENERATION, version)
+
+def load_showtimes(theater, first_time, last_time, title=None, *, fmt=None, clean=True):
     db = _connect()
     cur = db.cursor()
 
     where_title = ""
     query_params = (theater, first_time, last_time)
     if title:
-        where_title = f" AND s.title = {_PH}"
+        where_title += f" AND s.title = {_PH}"
         query_params += (title, )
+    if fmt:
+        where_title += f" AND s.format = {_PH}"
+        query_params += (fmt, )
 
     cur.execute(f"""
         SELECT *
@@ -46,19 +132,16 @@ def load_showtimes(theater, first_time, last_time, title=None, *, clean=True):
         if clean:
             del row_dict["create_time"]
         rows.append(row_dict)
+
+    _release(db)
     return rows
 
-def store_showtimes(theater, schedule, *, clean=True):
-    db = _connect()
-    cur = db.cursor()
+SHOWTIME_FIELD_NAMES = ("theater", "title", "format", "is_open_caption", "no_alist", "start_time", "end_time", "create_time")
 
-    create_time = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
-    inserted = []
+def _showtime_values(theater, schedule, create_time):
     for movie in schedule.movies:
         for showing in movie.showings:
-            field_names = ("theater", "title", "format", "is_open_caption", "no_alist", "start_time", "end_time", "create_time")
-            field_names_str = ", ".join(field_names)
-            field_values = (
+            yield (
                 theater,
                 movie.name,
                 showing.fmt,
@@ -68,50 +151,215 @@ def store_showtimes(theater, schedule, *, clean=True):
                 showing.end.isoformat(),
                 create_time
             )
-            
-            cur.execute(f"""
-                INSERT INTO showtimes({field_names_str})
-                VALUES ({', '.join([_PH] * len(field_names))})
-                ON CONFLICT(theater, title, format, is_open_caption, no_alist, start_time) DO NOTHING""",
-                field_values
-            )
-            
-            inserted_dict = dict(zip(field_names, field_values))
-            inserted_dict["is_open_caption"] = inserted_dict["is_open_caption"] == 1
-            inserted_dict["no_alist"] = inserted_dict["no_alist"] == 1
-            if clean:
-                del inserted_dict["create_time"]
-            inserted.append(inserted_dict)
 
-    db.commit()
-    db.close()
+CHANGE_FIELD_NAMES = ("change", ) + SHOWTIME_FIELD_NAMES[:-1] + ("previous_end_time", "change_time")
+
+def _begin_write(cur):
+    # Writers take turns, so that change sequence numbers commit in order and
+    # a reader's cursor never skips past a change which is still uncommitted.
+    # A transaction left open would be silently continued, so BEGIN
+    # IMMEDIATE is allowed to fail on one instead.
+    if _PH == "?":
+        cur.execute("BEGIN IMMEDIATE")
+    else:
+        cur.execute("LOCK TABLE showtime_changes IN EXCLUSIVE MODE")
+
+def _log_changes(cur, changes):
+    cur.executemany(f"""
+        INSERT INTO showtime_changes({', '.join(CHANGE_FIELD_NAMES)})
+        VALUES ({', '.join([_PH] * len(CHANGE_FIELD_NAMES))})""",
+        changes
+    )
+
+def _existing_end_times(cur, field_values_list):
+    theater_starts = {}
+    for values in field_values_list:
+        theater_starts.setdefault(values[0], []).append(values[5])
+
+    existing = {}
+    for theater, starts in theater_starts.items():
+        cur.execute(f"""
+            SELECT title, format, is_open_caption, no_alist, start_time, end_time
+            FROM showtimes
+            WHERE theater = {_PH} AND start_time >= {_PH} AND start_time <= {_PH}""",
+            (theater, min(starts), max(starts))
+        )
+        for row in cur.fetchall():
+            key = (theater, row["title"], row["format"], row["is_open_caption"], row["no_alist"], row["start_time"])
+            existing[key] = row["end_time"]
+    return existing
+
+def _insert_showtimes(cur, field_values_list):
+    """Inserts the new showtimes and updates the end time of existing ones, logging both as changes."""
+    _begin_write(cur)
+    existing = _existing_end_times(cur, field_values_list)
+
+    new_values_list = []
+    updated_values_list = []
+    changes = []
+    for values in field_values_list:
+        key, end_time, create_time = values[:6], values[6], values[7]
+        if key not in existing:
+            new_values_list.append(values)
+            changes.append(("add", ) + key + (end_time, None, create_time))
+        elif existing[key] != end_time:
+            updated_values_list.append((end_time, ) + key)
+            changes.append(("update", ) + key + (end_time, existing[key], create_time))
+        existing[key] = end_time
+
+    cur.executemany(f"""
+        INSERT INTO showtimes({', '.join(SHOWTIME_FIELD_NAMES)})
+        VALUES ({', '.join([_PH] * len(SHOWTIME_FIELD_NAMES))})
+        ON CONFLICT(theater, title, format, is_open_caption, no_alist, start_time) DO NOTHING""",
+        new_values_list
+    )
+    key_where_str = " AND ".join([f"{field} = {_PH}" for field in SHOWTIME_FIELD_NAMES[:6]])
+    cur.executemany(f"UPDATE showtimes SET end_time = {_PH} WHERE {key_where_str}", updated_values_list)
+    _log_changes(cur, changes)
+
+def store_showtimes(theater, schedule, *, clean=True):
+    return store_all_showtimes({theater: schedule}, clean=clean)[theater]
+
+def store_all_showtimes(theaters_to_schedule, *, clean=True):
+    db = _connect()
+    cur = db.cursor()
+
+    create_time = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+    inserted_by_theater = {}
+    try:
+        for theater, schedule in theaters_to_schedule.items():
+            field_values_list = list(_showtime_values(theater, schedule, create_time))
 
-    return inserted
+            # One transaction per theater, so a failure partway through a
+            # multi-theater run keeps the theaters that were already written.
+            try:
+                _insert_showtimes(cur, field_values_list)
+                db.commit()
+            except:
+                db.rollback()
+                raise
+
+            inserted = []
+            for field_values in field_values_list:
+                inserted_dict = dict(zip(SHOWTIME_FIELD_NAMES, field_values))
+                inserted_dict["is_open_caption"] = inserted_dict["is_open_caption"] == 1
+                inserted_dict["no_alist"] = inserted_dict["no_alist"] == 1
+                if clean:
+                    del inserted_dict["create_time"]
+                inserted.append(inserted_dict)
+            inserted_by_theater[theater] = inserted
+    finally:
+        _release(db)
+        if inserted_by_theater:
+            _notify_commit()
+
+    return inserted_by_theater
+
+def load_changes(after_seq=0, limit=1000):
+    """Returns the showtime changes after the given sequence number, oldest first."""
+    db = _connect()
+    cur = db.cursor()
+
+    cur.execute(f"""
+        SELECT *
+        FROM showtime_changes c
+        WHERE c.seq > {_PH}
+        ORDER BY c.seq
+        LIMIT {_PH}""",
+        (after_seq, limit)
+    )
+
+    rows = [_showtime_dict(row) for row in cur.fetchall()]
+
+    _release(db)
+    return rows
+
+def load_completed_shards(job):
+    db = _connect()
+    cur = db.cursor()
+
+    cur.execute(f"SELECT theater, day FROM backfill_shards WHERE job = {_PH}", (job, ))
+    completed = {(row["theater"], row["day"]) for row in cur.fetchall()}
+
+    _release(db)
+    return completed
+
+def store_backfill_shards(job, shards):
+    """Stores the showtimes of each (theater, day, schedule) shard, and checkpoints the shards as complete.
+
+    Both happen in one transaction, so a shard is only ever checkpointed along
+    with its showtimes.
+    """
+    db = _connect()
+    cur = db.cursor()
+
+    create_time = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    field_values_list = []
+    for theater, day, schedule in shards:
+        if schedule:
+            field_values_list.extend(_showtime_values(theater, schedule, create_time))
+
+    try:
+        _insert_showtimes(cur, field_values_list)
+        cur.executemany(f"""
+            INSERT INTO backfill_shards(job, theater, day, complete_time)
+            VALUES ({_PH}, {_PH}, {_PH}, {_PH})
+            ON CONFLICT(job, theater, day) DO NOTHING""",
+            [(job, theater, day.isoformat(), create_time) for theater, day, _ in shards]
+        )
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        _release(db)
+    _notify_commit()
+
+    return len(field_values_list)
 
 def delete_showtimes(showtimes_dicts):
+    if not showtimes_dicts:
+        return
+
     db = _connect()
     cur = db.cursor()
 
     delete_time = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    delete_field_names = ("theater", "title", "format", "is_open_caption", "no_alist", "start_time")
+    delete_field_where_str = " and ".join([f"{field} = {_PH}" for field in delete_field_names])
+    new_insert_field_names = ("end_time", "delete_time")
+    insert_field_names = delete_field_names + new_insert_field_names
+    insert_field_names_str = ", ".join(insert_field_names)
+
+    delete_values_list = []
+    insert_values_list = []
+    changes = []
     for showtime in showtimes_dicts:
-        delete_field_names = ("theater", "title", "format", "is_open_caption", "no_alist", "start_time")
-        delete_field_where_str = " and ".join([f"{field} = {_PH}" for field in delete_field_names])
         delete_field_raw_values = tuple([showtime[field] for field in delete_field_names])
         delete_field_values = tuple([int(value) if isinstance(value, bool) else value for value in delete_field_raw_values])
-        cur.execute(f"DELETE FROM showtimes WHERE {delete_field_where_str}", delete_field_values)
+        delete_values_list.append(delete_field_values)
 
-        new_insert_field_names = ("end_time", "delete_time")
-        insert_field_names = delete_field_names + new_insert_field_names
-        insert_field_names_str = ", ".join(insert_field_names)
         insert_field_values = delete_field_values + tuple([showtime[field] for field in new_insert_field_names[:-1]])
-        cur.execute(f"""
+        insert_values_list.append(insert_field_values + (delete_time,))
+        changes.append(("remove", ) + delete_field_values + (showtime["end_time"], None, delete_time))
+
+    try:
+        _begin_write(cur)
+        cur.executemany(f"DELETE FROM showtimes WHERE {delete_field_where_str}", delete_values_list)
+        cur.executemany(f"""
             INSERT INTO deleted_showtimes({insert_field_names_str})
             VALUES ({', '.join([_PH] * len(insert_field_names))})""",
-            tuple(insert_field_values) + (delete_time,)
+            insert_values_list
         )
-
-    db.commit()
-    db.close()
+        _log_changes(cur, changes)
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        _release(db)
+    _notify_commit()
 
 def load_deleted_showtimes(first_delete_time, last_delete_time, *, clean=True):
     db = _connect()
@@ -134,8 +382,71 @@ def load_deleted_showtimes(first_delete_time, last_delete_time, *, clean=True):
             del row_dict["delete_time"]
             del row_dict["id"]
         rows.append(row_dict)
+
+    _release(db)
     return rows
 
+def showtimes_fingerprint(theater, first_time, last_time):
+    """Summarizes the showtimes in a range, such that any change to them changes it."""
+    db = _connect()
+    cur = db.cursor()
+
+    cur.execute(f"""
+        SELECT COUNT(*) AS showtime_count, MAX(create_time) AS last_create_time
+        FROM showtimes s
+        WHERE s.theater = {_PH} AND s.start_time{_DATETIME} >= {_PH} AND s.start_time{_DATETIME} <= {_PH}""",
+        (theater, first_time, last_time)
+    )
+    row = cur.fetchone()
+    cur.execute(f"""
+        SELECT MAX(seq) AS last_seq
+        FROM showtime_changes c
+        WHERE c.theater = {_PH} AND c.start_time{_DATETIME} >= {_PH} AND c.start_time{_DATETIME} <= {_PH}""",
+        (theater, first_time, last_time)
+    )
+    change_row = cur.fetchone()
+    _release(db)
+
+    return f"{row['showtime_count']}:{row['last_create_time']}:{change_row['last_seq']}"
+
+def load_snapshot(theater, week_start):
+    db = _connect()
+    cur = db.cursor()
+
+    cur.execute(f"""
+        SELECT *
+        FROM schedule_snapshots s
+        WHERE s.theater = {_PH} AND s.week_start = {_PH}""",
+        (theater, week_start.isoformat())
+    )
+    row = cur.fetchone()
+    _release(db)
+
+    return dict(row) if row else None
+
+def store_snapshot(theater, week_start, fingerprint, plaintext, ics):
+    db = _connect()
+    cur = db.cursor()
+
+    create_time = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    try:
+        cur.execute(f"""
+            INSERT INTO schedule_snapshots(theater, week_start, fingerprint, plaintext, ics, create_time)
+            VALUES ({', '.join([_PH] * 6)})
+            ON CONFLICT(theater, week_start) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                plaintext = excluded.plaintext,
+                ics = excluded.ics,
+                create_time = excluded.create_time""",
+            (theater, week_start.isoformat(), fingerprint, plaintext, ics, create_time)
+        )
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        _release(db)
+
 def theaters_last_update():
     db = _connect()
     cur = db.cursor()
@@ -146,14 +457,184 @@ def theaters_last_update():
         GROUP BY theater"""
     )
 
-    return {row["theater"]: row["last_update_time"] for row in cur.fetchall()}
+    last_updates = {row["theater"]: row["last_update_time"] for row in cur.fetchall()}
+
+    _release(db)
+    return last_updates
+
+
+def _showtime_dict(row):
+    row_dict = dict(row)
+    row_dict["is_open_caption"] = row["is_open_caption"] == 1
+    row_dict["no_alist"] = row["no_alist"] == 1
+    return row_dict
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _partition_name(month):
+    return f"showtimes_y{month.year}m{month.month:02}"
+
+def _is_partitioned(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = 'showtimes'")
+    row = cur.fetchone()
+    return bool(row) and row["relkind"] == "p"
+
+def _showtime_partitions(cur):
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'showtimes'::regclass""")
+
+    partitions = []
+    for row in cur.fetchall():
+        name = row["relname"]
+        if name.startswith("showtimes_y"):
+            partitions.append((name, date(int(name[11:15]), int(name[16:18]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def _create_showtime_partitions(cur, months_ahead):
+    month = datetime.now(timezone.utc).date().replace(day=1)
+    created = []
+    for _ in range(months_ahead + 1):
+        next_month = _next_month(month)
+        name = _partition_name(month)
+
+        # A partition can't be created over rows which already landed in the
+        # default partition, so those months are left where they are.
+        cur.execute(
+            "SELECT 1 FROM showtimes_default WHERE start_time >= %s AND start_time < %s LIMIT 1",
+            (month.isoformat(), next_month.isoformat())
+        )
+        if not cur.fetchone():
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF showtimes
+                FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')""")
+            created.append(name)
+        month = next_month
+    return created
+
+def ensure_showtime_partitions(months_ahead=3):
+    """Creates the monthly showtimes partitions up to some months ahead.
+
+    Only applies to Postgres databases whose showtimes table is partitioned.
+    """
+    if not os.getenv('DATABASE_URL'):
+        return []
+
+    db = _connect()
+    cur = db.cursor()
+
+    created = _create_showtime_partitions(cur, months_ahead) if _is_partitioned(cur) else []
+
+    db.commit()
+    _release(db)
+    return created
+
+def archive_showtimes_before(cutoff, archive_rows):
+    """Removes the showtimes starting before the cutoff date, after passing them to archive_rows.
+
+    Whole monthly partitions are dropped where possible. Nothing is removed if
+    archive_rows raises.
+    """
+    db = _connect()
+    cur = db.cursor()
+
+    try:
+        rows = []
+        if os.getenv('DATABASE_URL') and _is_partitioned(cur):
+            for name, month in _showtime_partitions(cur):
+                if _next_month(month).isoformat() <= cutoff:
+                    cur.execute(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE")
+                    cur.execute(f"SELECT * FROM {name}")
+                    rows.extend(_showtime_dict(row) for row in cur.fetchall())
+                    cur.execute(f"DROP TABLE {name}")
+
+        cur.execute(f"DELETE FROM showtimes WHERE start_time < {_PH} RETURNING *", (cutoff, ))
+        rows.extend(_showtime_dict(row) for row in cur.fetchall())
+
+        if rows:
+            archive_rows(rows)
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        _release(db)
+
+    if rows:
+        _notify_commit()
+    return len(rows)
+
+def archive_deleted_showtimes_before(cutoff, archive_rows):
+    """Removes the deletions recorded before the cutoff date, after passing them to archive_rows.
+
+    Nothing is removed if archive_rows raises.
+    """
+    db = _connect()
+    cur = db.cursor()
+
+    try:
+        cur.execute(f"DELETE FROM deleted_showtimes WHERE delete_time < {_PH} RETURNING *", (cutoff, ))
+        rows = [_showtime_dict(row) for row in cur.fetchall()]
+
+        if rows:
+            archive_rows(rows)
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        _release(db)
+
+    return len(rows)
+
+def delete_snapshots_before(week_start):
+    db = _connect()
+    cur = db.cursor()
+
+    try:
+        cur.execute(f"DELETE FROM schedule_snapshots WHERE week_start < {_PH}", (week_start.isoformat(), ))
+        deleted_count = cur.rowcount
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        _release(db)
+    return deleted_count
+
+def compact():
+    db = _connect()
+    if os.getenv('DATABASE_URL'):
+        # VACUUM can't run inside a transaction.
+        db.autocommit = True
+        cur = db.cursor()
+        cur.execute("VACUUM ANALYZE showtimes")
+        cur.execute("VACUUM ANALYZE deleted_showtimes")
+        cur.execute("VACUUM ANALYZE schedule_snapshots")
+    else:
+        db.execute("VACUUM")
+        db.execute("PRAGMA optimize")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    _release(db)
 
 
 def _init_db():
     db = _connect()
     cur = db.cursor()
 
-    cur.execute("""CREATE TABLE IF NOT EXISTS showtimes (
+    postgres = bool(os.getenv('DATABASE_URL'))
+    if not postgres:
+        # Lets readers in other processes carry on while a write is underway.
+        # The journal mode is stored in the database file, so it's set once here.
+        db.execute("PRAGMA journal_mode = WAL")
+
+    # On Postgres, a new showtimes table is partitioned by month so that old
+    # months can be dropped whole. An existing unpartitioned table is kept.
+    partition_clause = " PARTITION BY RANGE (start_time)" if postgres else ""
+    cur.execute(f"""CREATE TABLE IF NOT EXISTS showtimes (
         theater TEXT NOT NULL,
         title TEXT NOT NULL,
         format TEXT,
@@ -163,7 +644,10 @@ def _init_db():
         end_time TEXT NOT NULL,
         create_time TEXT NOT NULL,
         PRIMARY KEY(theater, title, format, is_open_caption, no_alist, start_time)
-    )""")
+    ){partition_clause}""")
+    if postgres and _is_partitioned(cur):
+        cur.execute("CREATE TABLE IF NOT EXISTS showtimes_default PARTITION OF showtimes DEFAULT")
+        _create_showtime_partitions(cur, 3)
 
     # I could do this as a soft delete from showtimes. But this allows
     # capturing any instance of them re-adding the exact same showtime.
@@ -179,8 +663,50 @@ def _init_db():
         delete_time TEXT NOT NULL
     )""")
 
+    # Pre-rendered schedules for each theater's movie week. The fingerprint
+    # records the showtimes they were rendered from, to detect staleness.
+    cur.execute("""CREATE TABLE IF NOT EXISTS schedule_snapshots (
+        theater TEXT NOT NULL,
+        week_start TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        plaintext TEXT NOT NULL,
+        ics TEXT NOT NULL,
+        create_time TEXT NOT NULL,
+        PRIMARY KEY(theater, week_start)
+    )""")
+
+    # Checkpoints of the (theater, day) shards each backfill job has stored.
+    cur.execute("""CREATE TABLE IF NOT EXISTS backfill_shards (
+        job TEXT NOT NULL,
+        theater TEXT NOT NULL,
+        day TEXT NOT NULL,
+        complete_time TEXT NOT NULL,
+        PRIMARY KEY(job, theater, day)
+    )""")
+
+    # Append-only log of every showtime added, removed or given a new end
+    # time, written in the same transaction as the change itself.
+    seq_type = "BIGSERIAL PRIMARY KEY" if postgres else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    cur.execute(f"""CREATE TABLE IF NOT EXISTS showtime_changes (
+        seq {seq_type},
+        change TEXT NOT NULL,
+        theater TEXT NOT NULL,
+        title TEXT NOT NULL,
+        format TEXT,
+        is_open_caption INT NOT NULL,
+        no_alist INT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        previous_end_time TEXT,
+        change_time TEXT NOT NULL
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS showtime_changes_theater_start_time ON showtime_changes(theater, start_time)")
+    # Range queries and retention filter on these, rather than on the primary key.
+    cur.execute("CREATE INDEX IF NOT EXISTS showtimes_theater_start_time ON showtimes(theater, start_time)")
+    cur.execute("CREATE INDEX IF NOT EXISTS deleted_showtimes_delete_time ON deleted_showtimes(delete_time)")
+
     db.commit()
-    db.close()
+    _release(db)
 
 
 _init_db()
@@ -0,0 +1,209 @@
+"""Local stand-in for the Fandango napi, for exercising fetches without fandango.com.
+
+Run it with `python -m retriever.fake_fandango`, then point the retriever at it
+with FANDANGO_BASE_URL=http://127.0.0.1:8081.
+"""
+import argparse
+import json
+import random
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+from urllib.parse import parse_qs, urlsplit
+
+from retriever.archive import ArchiveReader
+from retriever.theaters import THEATERS
+
+
+CODE_TO_THEATER = {info["code"]: theater for theater, info in THEATERS.items()}
+FORMATS = (
+    ("Standard Format", []),
+    ("IMAX", [{"name": "IMAX"}]),
+    ("Dolby Cinema @ AMC", []),
+    ("RealD 3D", [{"name": "RealD 3D"}]),
+    ("Standard Format", [{"name": "Open Caption"}])
+)
+SHOWTIMES = ("10:30a", "11:45a", "1:00p", "2:15p", "3:30p", "4:45p", "6:00p", "7:15p", "8:30p", "9:45p", "11:00p")
+
+
+class FakeFandangoConfig:
+    def __init__(self, *, latency=0.05, jitter=0.02, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 movies=15, padding_kb=0, archive_path=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.movies = movies
+        self.padding_kb = padding_kb
+        self.archive_path = archive_path
+        self.seed = seed
+
+
+def synthetic_payload(theater, day, movies, padding_kb=0):
+    """Builds a theaterMovieShowtimes document shaped like the real one, deterministic per theater and day."""
+    rng = random.Random(f"{theater}|{day.isoformat()}")
+    padding = "x" * (padding_kb * 1024 // max(movies, 1))
+
+    movie_infos = []
+    for movie_no in range(movies):
+        variants = []
+        for heading, amenities in rng.sample(FORMATS, rng.randint(1, 3)):
+            amenity_group = {
+                "amenities": amenities,
+                "isDolby": heading.startswith("Dolby"),
+                "showtimes": [{"date": showtime, "ticketingUrl": f"/tickets/{rng.getrandbits(32):x}"}
+                              for showtime in sorted(rng.sample(SHOWTIMES, rng.randint(2, 6)), key=SHOWTIMES.index)]
+            }
+            variants.append({"filmFormatHeader": heading, "format": heading, "amenityGroups": [amenity_group]})
+
+        movie_infos.append({
+            "title": f"Synthetic Feature {movie_no} ({2000 + movie_no % 25})",
+            "runtime": rng.randint(85, 180),
+            "rating": rng.choice(("G", "PG", "PG-13", "R")),
+            "synopsis": padding,
+            "variants": variants
+        })
+
+    return {
+        "viewModel": {
+            "date": day.isoformat(),
+            "theater": {"name": theater, "code": THEATERS[theater]["code"]},
+            "movies": movie_infos
+        }
+    }
+
+
+class FakeFandangoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeFandangoRequestHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.archive = ArchiveReader(config.archive_path) if config.archive_path else None
+        self.stats = []
+        self._lock = threading.Lock()
+
+    def record(self, status, duration):
+        with self._lock:
+            self.stats.append((status, duration))
+
+    def roll(self):
+        with self._lock:
+            return self.rng.random()
+
+    def payload(self, theater, day):
+        if self.archive:
+            recorded = self.archive.read(theater, day)
+            if recorded is not None:
+                return recorded
+        return json.dumps(synthetic_payload(theater, day, self.config.movies, self.config.padding_kb)).encode("utf-8")
+
+    def server_close(self):
+        super().server_close()
+        if self.archive:
+            self.archive.close()
+
+
+class FakeFandangoRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        start = perf_counter()
+        config = self.server.config
+        status, body, headers = self._respond(config)
+
+        sleep(max(0, config.latency + self.server.rng.uniform(-config.jitter, config.jitter)))
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.server.record(status, perf_counter() - start)
+
+    def _respond(self, config):
+        url = urlsplit(self.path)
+        path_parts = url.path.strip("/").split("/")
+        if len(path_parts) != 3 or path_parts[:2] != ["napi", "theaterMovieShowtimes"] or path_parts[2] not in CODE_TO_THEATER:
+            return 404, b'{"error": "not found"}', {}
+
+        roll = self.server.roll()
+        if roll < config.throttle_rate:
+            return 429, b'{"error": "too many requests"}', {"Retry-After": str(config.retry_after)}
+        if roll < config.throttle_rate + config.error_rate:
+            return 503, b'{"error": "unavailable"}', {}
+
+        try:
+            day = date.fromisoformat(parse_qs(url.query)["startDate"][0])
+        except (KeyError, ValueError):
+            return 400, b'{"error": "bad startDate"}', {}
+
+        return 200, self.server.payload(CODE_TO_THEATER[path_parts[2]], day), {}
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Starts the server on a background thread, returning it along with its base URL."""
+    server = FakeFandangoServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def summarize(stats, wall_time):
+    durations = sorted(duration for _, duration in stats)
+
+    def _percentile(fraction):
+        return durations[round(fraction * (len(durations) - 1))] if durations else 0
+
+    statuses = {}
+    for status, _ in stats:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "requests": len(stats),
+        "statuses": statuses,
+        "requests_per_sec": len(stats) / wall_time if wall_time else 0,
+        "p50_ms": _percentile(0.5) * 1000,
+        "p99_ms": _percentile(0.99) * 1000,
+        "wall_time_s": wall_time
+    }
+
+
+def add_config_args(parser):
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Seconds the latency varies by, either way.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with a 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429.")
+    parser.add_argument("--movies", type=int, default=15, help="Movies in each synthetic payload.")
+    parser.add_argument("--padding-kb", type=int, default=0, help="Unused data added to each synthetic payload.")
+    parser.add_argument("--archive", dest="archive_path", help="Serve recorded payloads from this snapshot archive.")
+    parser.add_argument("--seed", type=int)
+
+def config_from_args(args):
+    return FakeFandangoConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after, movies=args.movies, padding_kb=args.padding_kb,
+        archive_path=args.archive_path, seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    with FakeFandangoServer((args.host, args.port), config_from_args(args)) as server:
+        print(f"Serving fake napi on http://{args.host}:{args.port}")
+        server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import calendar
 import itertools
-import json
+import os
 import requests
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+from time import sleep
 
+from retriever.payloads import decode_lean
 from retriever.schedule import DaySchedule
 from retriever.theaters import THEATERS
 
 
+FANDANGO_BASE_URL = os.getenv("FANDANGO_BASE_URL", "https://www.fandango.com")
+MAX_RETRIES = int(os.getenv("FANDANGO_MAX_RETRIES", 3))
+RETRY_BACKOFF = 1.0
+# Seconds to wait for a connection, and then between bytes of the response.
+REQUEST_TIMEOUT = float(os.getenv("FANDANGO_TIMEOUT", 30))
+
+
 def _load_schedule(showtimes_json, theater):
     day = date.fromisoformat(showtimes_json["viewModel"]["date"])
     schedule = DaySchedule(day)
@@ -39,16 +48,57 @@ def _load_schedule(showtimes_json, theater):
     return schedule
 
 
-def _retrieve_json(theater, showdate):
-    url = f"https://www.fandango.com/napi/theaterMovieShowtimes/{THEATERS[theater]['code']}?startDate={showdate.date().isoformat()}"
-    headers = {"referer": f"https://www.fandango.com/{THEATERS[theater]['slug']}/theater-page?format=all&date={showdate.date().isoformat()}"}
-    return requests.get(url, headers=headers).json()
+def retrieve_payload(theater, showdate):
+    url = f"{FANDANGO_BASE_URL}/napi/theaterMovieShowtimes/{THEATERS[theater]['code']}?startDate={showdate.date().isoformat()}"
+    headers = {"referer": f"{FANDANGO_BASE_URL}/{THEATERS[theater]['slug']}/theater-page?format=all&date={showdate.date().isoformat()}"}
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.Timeout:
+            if attempt == MAX_RETRIES:
+                raise
+            sleep(RETRY_BACKOFF * 2 ** attempt)
+            continue
+
+        # Throttling and server errors are retried, honoring Retry-After when given.
+        if response.status_code == 429 or response.status_code >= 500:
+            if attempt < MAX_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                sleep(float(retry_after) if retry_after.replace(".", "", 1).isdigit() else RETRY_BACKOFF * 2 ** attempt)
+                continue
+            response.raise_for_status()
 
+        # Other client errors come back with a JSON body that has no viewModel,
+        # which the callers already skip.
+        return response.content
 
-def _showtimes_iter(theater, filepath, date_range):
-    if filepath:
-        with open(filepath) as showtimes_file:
-            yield json.read(showtimes_file)
+
+def _retrieve_json(theater, showdate):
+    return decode_lean(retrieve_payload(theater, showdate))
+
+
+def _archive_days(archive, theater, date_range):
+    if not date_range:
+        return archive.days(theater)
+
+    current_date, end_date = [day.date() if isinstance(day, datetime) else day for day in date_range]
+    days = []
+    while current_date <= end_date:
+        days.append(current_date)
+        current_date += timedelta(days=1)
+    return days
+
+
+def _showtimes_iter(theater, filepath, date_range, archive=None):
+    if archive:
+        for day in _archive_days(archive, theater, date_range):
+            payload = archive.read(theater, day)
+            if payload is not None:
+                yield decode_lean(payload)
+    elif filepath:
+        with open(filepath, "rb") as showtimes_file:
+            yield decode_lean(showtimes_file.read())
     elif date_range:
         current_date, end_date = date_range
         while current_date <= end_date:
@@ -56,11 +106,18 @@ def _showtimes_iter(theater, filepath, date_range):
             current_date += timedelta(days=1)
 
 
-def load_schedules_by_day(theater, filepath, date_range, filter_params, quiet=False):
+def load_day_schedule(theater, showdate):
+    """Retrieves and parses one day of a theater's schedule, or returns None if there is none."""
+    showtimes_json = _retrieve_json(theater, showdate)
+    if "viewModel" in showtimes_json:
+        return _load_schedule(showtimes_json, theater)
+
+
+def load_schedules_by_day(theater, filepath, date_range, filter_params, quiet=False, *, archive=None):
     schedules_by_day = []
     if not quiet:
         print(".", end="", flush=True)
-    for showtimes_json in _showtimes_iter(theater, filepath, date_range):
+    for showtimes_json in _showtimes_iter(theater, filepath, date_range, archive):
         if "viewModel" in showtimes_json:
             schedule = _load_schedule(showtimes_json, theater)
             filtered_schedule = schedule.filter(filter_params)
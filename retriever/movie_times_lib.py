@@ -3,15 +3,14 @@ import json
 import os
 import traceback
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
-from ical.calendar import Calendar
-from ical.calendar_stream import IcsCalendarStream
-from ical.event import Event
 from mailtrap import Address, Attachment, Mail, MailtrapClient
 
-from retriever import db
-from retriever.fandango_json import load_schedules_by_day
+from retriever import db, snapshots
+from retriever.fandango_json import load_schedules_by_day, retrieve_payload
+from retriever.render import render_ics, render_json, render_plaintext
 from retriever.schedule import Filter, FullSchedule, ParseError
 from retriever.theaters import timezone
 
@@ -22,30 +21,14 @@ def _build_attachment(content, filename, *, encoding="utf-8"):
         filename=filename
     )
 
-def _ics_attachments(theaters_to_schedule):
-    attachments = []
-    for theater, schedule in theaters_to_schedule.items():
-        calendar = Calendar()
-        for movie in schedule.movies:
-            for showing in movie.showings:
-                start = showing.start
-                end = showing.end or (start + timedelta(minutes=5))
-                calendar.events.append(
-                    Event(summary=movie.name, start=start, end=end),
-                )
-
-        calendar_ics = IcsCalendarStream.calendar_to_ics(calendar)
-        attachments.append(_build_attachment(calendar_ics, f"{theater}.ics"))
-
-    return attachments
-
-def _plaintext_attachments(theaters_to_schedule):
-    attachments = []
-    for theater, schedule in theaters_to_schedule.items():
-        schedule_text = schedule.output(name_only=False, date_only=True)
-        attachments.append(_build_attachment(schedule_text, f"{theater}.txt"))
+def _rendered_attachments(theaters_to_rendered):
+    plaintext_attachments = []
+    ics_attachments = []
+    for theater, (schedule_text, calendar_ics) in theaters_to_rendered.items():
+        plaintext_attachments.append(_build_attachment(schedule_text, f"{theater}.txt"))
+        ics_attachments.append(_build_attachment(calendar_ics, f"{theater}.ics"))
 
-    return attachments
+    return plaintext_attachments + ics_attachments
 
 def _send_email(subject, text, sender=None, sender_name=None, receiver=None, attachments=[]):
     sender = sender or os.environ.get("MAILTRAP_SENDER")
@@ -65,7 +48,14 @@ def _send_email(subject, text, sender=None, sender_name=None, receiver=None, att
 
 
 def email_theater_schedules(theaters_to_schedule, dates, sender, sender_name, receiver):
-    attachments = _plaintext_attachments(theaters_to_schedule) + _ics_attachments(theaters_to_schedule)
+    theaters_to_rendered = {
+        theater: (render_plaintext(schedule), render_ics(schedule))
+        for theater, schedule in theaters_to_schedule.items()
+    }
+    email_rendered_schedules(theaters_to_rendered, dates, sender, sender_name, receiver)
+
+def email_rendered_schedules(theaters_to_rendered, dates, sender, sender_name, receiver):
+    attachments = _rendered_attachments(theaters_to_rendered)
 
     subject = f"Movie Schedules {dates[0].isoformat()}"
     if dates[0] != dates[1]:
@@ -74,8 +64,11 @@ def email_theater_schedules(theaters_to_schedule, dates, sender, sender_name, re
     _send_email(subject, "Schedules attached", sender, sender_name, receiver, attachments)
 
 
-def collect_schedule(theater, filepath, date_range, filter_params, quiet):
-    schedules_by_day = load_schedules_by_day(theater, filepath, date_range, filter_params, quiet)
+def collect_schedule(theater, filepath, date_range, filter_params, quiet, *, from_db=False, archive=None):
+    if from_db:
+        schedules_by_day = snapshots.load_schedules_by_day_from_db(theater, date_range, filter_params)
+    else:
+        schedules_by_day = load_schedules_by_day(theater, filepath, date_range, filter_params, quiet, archive=archive)
 
     if not schedules_by_day:
         print("[WARN] Could not find any data for the requested date(s).")
@@ -83,8 +76,92 @@ def collect_schedule(theater, filepath, date_range, filter_params, quiet):
 
     return FullSchedule.create(schedules_by_day)
 
+def collect_all_schedules(theaters, date_range, filter_params, *, archive=None):
+    """Collects the schedule of each theater concurrently.
 
-def db_showtime_updates(theater, date_range, detected_showtimes):
+    Theaters without any data, or whose collection failed, are left out of
+    the result, so that one theater's failure doesn't cost the others.
+    """
+    def _collect(theater):
+        return collect_schedule(theater, None, date_range, filter_params, True, archive=archive)
+
+    with ThreadPoolExecutor(max_workers=len(theaters) or 1) as executor:
+        futures = {theater: executor.submit(_collect, theater) for theater in theaters}
+
+    theaters_to_schedule = {}
+    for theater, future in futures.items():
+        try:
+            schedule = future.result()
+        except Exception as exc:
+            print(f"[WARN] Could not collect the schedule for {theater}: {exc!r}")
+            continue
+
+        if schedule:
+            theaters_to_schedule[theater] = schedule
+    return theaters_to_schedule
+
+
+def db_update_theaters(theaters, date_range, *, archive=None, detect_deletions=True):
+    """Collects and stores the theaters' schedules, then removes any stored showtimes no longer listed.
+
+    Returns the removed showtimes. With detect_deletions off, nothing is
+    removed; replays of recorded data must not delete live showtimes.
+    """
+    theaters_to_schedule = collect_all_schedules(theaters, date_range, Filter.empty(), archive=archive)
+    return db_store_schedules(theaters_to_schedule, date_range, detect_deletions=detect_deletions)
+
+def db_store_schedules(theaters_to_schedule, date_range, *, detect_deletions=True):
+    theaters_to_showtimes = db.store_all_showtimes(theaters_to_schedule)
+    deleted_showtimes = db_all_showtime_updates(theaters_to_showtimes, date_range) if detect_deletions else []
+    snapshots.refresh_snapshots(theaters_to_schedule.keys(), date_range)
+    return deleted_showtimes
+
+
+def write_schedule_files(theaters_to_schedule, output_dir, fmt):
+    os.makedirs(output_dir, exist_ok=True)
+    for theater, schedule in theaters_to_schedule.items():
+        if fmt == "json":
+            content = render_json(theater, schedule)
+        else:
+            content = schedule.output(name_only=False, date_only=False)
+
+        with open(os.path.join(output_dir, f"{theater}.{'json' if fmt == 'json' else 'txt'}"), "w") as schedule_file:
+            schedule_file.write(content + "\n")
+
+
+def fan_out(sinks):
+    """Runs each named sink concurrently, returning their results and, separately, any exceptions they raised."""
+    with ThreadPoolExecutor(max_workers=len(sinks) or 1) as executor:
+        futures = {name: executor.submit(sink) for name, sink in sinks.items()}
+
+    results = {}
+    failures = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as exc:
+            failures[name] = exc
+    return results, failures
+
+
+def record_payloads(archive_writer, theaters, date_range):
+    """Fetches the raw showtimes payload of each theater and day into the archive."""
+    jobs = []
+    current_date, end_date = date_range
+    while current_date <= end_date:
+        jobs.extend((theater, current_date) for theater in theaters)
+        current_date += timedelta(days=1)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {executor.submit(retrieve_payload, theater, showdate): (theater, showdate) for theater, showdate in jobs}
+        for future in as_completed(futures):
+            theater, showdate = futures[future]
+            archive_writer.add(theater, showdate.date(), future.result())
+
+    return len(jobs)
+
+
+def _detect_deleted_showtimes(theater, date_range, detected_showtimes):
     tz = timezone(theater)
     now = datetime.now(tz).replace(microsecond=0).isoformat()
 
@@ -98,6 +175,16 @@ def db_showtime_updates(theater, date_range, detected_showtimes):
         if now < showtime_dict['start_time'] and showtime_dict not in detected_showtimes:
             deleted_showtimes.append(showtime_dict)
 
+    return deleted_showtimes
+
+def db_showtime_updates(theater, date_range, detected_showtimes):
+    return db_all_showtime_updates({theater: detected_showtimes}, date_range)
+
+def db_all_showtime_updates(theaters_to_showtimes, date_range):
+    deleted_showtimes = []
+    for theater, detected_showtimes in theaters_to_showtimes.items():
+        deleted_showtimes.extend(_detect_deleted_showtimes(theater, date_range, detected_showtimes))
+
     db.delete_showtimes(deleted_showtimes)
 
     return deleted_showtimes
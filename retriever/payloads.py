@@ -0,0 +1,61 @@
+"""Decoding of theaterMovieShowtimes payloads, keeping little more than the fields the parser reads.
+
+orjson is used when installed, otherwise the stdlib json module.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+MOVIE_KEYS = ("title", "runtime", "variants")
+# Every key on the path to a field _load_schedule reads. With the stdlib
+# decoder, any other key is dropped as soon as its object is decoded, so the
+# unread parts of the document never pile up.
+KEPT_KEYS = frozenset((
+    "viewModel", "date", "movies", "variants", "filmFormatHeader",
+    "amenityGroups", "amenities", "name", "isDolby", "showtimes"
+) + MOVIE_KEYS)
+
+
+def _kept_pairs(pairs):
+    return {key: value for key, value in pairs if key in KEPT_KEYS}
+
+_LEAN_DECODER = json.JSONDecoder(object_pairs_hook=_kept_pairs)
+
+
+def _prune(document):
+    # Error bodies need not be objects at all, e.g. [] or null.
+    if not isinstance(document, dict) or document.get("viewModel") is None:
+        return {}
+
+    view_model = document["viewModel"]
+    return {
+        "viewModel": {
+            "date": view_model["date"],
+            "movies": [{key: movie[key] for key in MOVIE_KEYS if key in movie} for movie in view_model.get("movies", [])]
+        }
+    }
+
+def decode_lean_orjson(payload):
+    # orjson decodes everything faster than the stdlib can skip it, so only the
+    # top few levels are pruned. Copying any deeper costs more than it saves.
+    return _prune(orjson.loads(payload))
+
+def decode_lean_stdlib(payload):
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = bytes(payload).decode("utf-8")
+    return _prune(_LEAN_DECODER.decode(payload))
+
+def decode_lean(payload):
+    """Decodes viewModel.date and viewModel.movies[*] title, runtime and variants from a payload.
+
+    Payloads without a viewModel, including any that aren't JSON objects,
+    decode to an empty dict. Which unread keys survive below the variants
+    depends on the decoder.
+    """
+    if orjson:
+        return decode_lean_orjson(payload)
+    return decode_lean_stdlib(payload)
@@ -0,0 +1,42 @@
+import json
+from datetime import timedelta
+
+from ical.calendar import Calendar
+from ical.calendar_stream import IcsCalendarStream
+from ical.event import Event
+
+
+def render_plaintext(schedule):
+    return schedule.output(name_only=False, date_only=True)
+
+def render_ics(schedule):
+    calendar = Calendar()
+    for movie in schedule.movies:
+        for showing in movie.showings:
+            start = showing.start
+            end = showing.end or (start + timedelta(minutes=5))
+            calendar.events.append(
+                Event(summary=movie.name, start=start, end=end),
+            )
+
+    return IcsCalendarStream.calendar_to_ics(calendar)
+
+def showtime_dicts(theater, schedule):
+    """Flattens a schedule into showtime dicts shaped like the stored showtimes."""
+    showtimes = []
+    for movie in schedule.movies:
+        for showing in movie.showings:
+            showtimes.append({
+                "theater": theater,
+                "title": movie.name,
+                "format": showing.fmt,
+                "is_open_caption": showing.is_open_caption,
+                "no_alist": showing.no_alist,
+                "start_time": showing.start.isoformat(),
+                "end_time": showing.end.isoformat()
+            })
+    return showtimes
+
+def render_json(theater, schedule):
+    showtimes = sorted(showtime_dicts(theater, schedule), key=lambda s: (s["start_time"], s["title"]))
+    return "[\n" + ",\n".join([f"  {json.dumps(s, sort_keys=True)}" for s in showtimes]) + "\n]"
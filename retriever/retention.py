@@ -0,0 +1,144 @@
+import gzip
+import json
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from retriever import db
+from retriever.snapshots import movie_week_start
+from retriever.theaters import timezone as theater_timezone
+
+
+DEFAULT_ARCHIVE_DIR = "archive"
+
+
+def _archive_path(archive_dir, table, month):
+    return os.path.join(archive_dir, f"{table}-{month}.jsonl.gz")
+
+def _write_archive(archive_dir, table, time_field, rows):
+    rows_by_month = defaultdict(list)
+    for row in rows:
+        rows_by_month[row[time_field][:7]].append(row)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    # Every month is staged next to its archive and only renamed into place
+    # once all of them are written, so a failure partway through leaves no
+    # rows behind to be archived a second time by the next run.
+    staged = []
+    try:
+        for month, month_rows in rows_by_month.items():
+            path = _archive_path(archive_dir, table, month)
+            staged_path = path + ".tmp"
+            staged.append((staged_path, path))
+
+            with open(staged_path, "wb") as staged_file:
+                if os.path.exists(path):
+                    with open(path, "rb") as archive_file:
+                        shutil.copyfileobj(archive_file, staged_file)
+                # Each run adds a new gzip member, which reads back as one stream.
+                with gzip.GzipFile(fileobj=staged_file, mode="wb") as member:
+                    member.write("".join(json.dumps(row, sort_keys=True) + "\n" for row in month_rows).encode("utf-8"))
+                staged_file.flush()
+                os.fsync(staged_file.fileno())
+    except:
+        for staged_path, _ in staged:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+        raise
+
+    for staged_path, path in staged:
+        os.replace(staged_path, path)
+
+def _months(first_day, last_day):
+    month = first_day.replace(day=1)
+    while month <= last_day:
+        yield month.isoformat()[:7]
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _read_archive(archive_dir, table, first_day, last_day):
+    for month in _months(first_day, last_day):
+        path = _archive_path(archive_dir, table, month)
+        if not os.path.exists(path):
+            continue
+
+        with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+            for line in archive_file:
+                yield json.loads(line)
+
+
+def _as_datetime(value, tz):
+    # Naive bounds, such as plain date strings, are taken to be in tz.
+    value = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=tz)
+
+def load_archived_showtimes(theater, first_time, last_time, title=None, *, fmt=None, archive_dir=DEFAULT_ARCHIVE_DIR, clean=True):
+    """Mirrors db.load_showtimes, but over the showtimes moved out by retention.
+
+    Naive bounds are in the theater's timezone.
+    """
+    tz = theater_timezone(theater)
+    first_time, last_time = _as_datetime(first_time, tz), _as_datetime(last_time, tz)
+
+    rows = []
+    for row in _read_archive(archive_dir, "showtimes", first_time.date() - timedelta(days=1), last_time.date()):
+        start = datetime.fromisoformat(row["start_time"])
+        if row["theater"] != theater or start < first_time or start > last_time:
+            continue
+        if title and row["title"] != title:
+            continue
+        if fmt and row["format"] != fmt:
+            continue
+
+        if clean:
+            del row["create_time"]
+        rows.append(row)
+    return sorted(rows, key=lambda row: row["title"])
+
+def load_archived_deleted_showtimes(first_delete_time, last_delete_time, *, archive_dir=DEFAULT_ARCHIVE_DIR, clean=True):
+    """Mirrors db.load_deleted_showtimes, but over the deletions moved out by retention.
+
+    Naive bounds are in UTC.
+    """
+    first_delete_time = _as_datetime(first_delete_time, timezone.utc)
+    last_delete_time = _as_datetime(last_delete_time, timezone.utc)
+
+    rows = []
+    for row in _read_archive(archive_dir, "deleted_showtimes", first_delete_time.date(), last_delete_time.date()):
+        delete_time = datetime.fromisoformat(row["delete_time"])
+        if delete_time < first_delete_time or delete_time > last_delete_time:
+            continue
+
+        if clean:
+            del row["delete_time"]
+            del row["id"]
+        rows.append(row)
+    return sorted(rows, key=lambda row: row["title"])
+
+
+def run_maintenance(keep_days, keep_deleted_days, *, archive_dir=DEFAULT_ARCHIVE_DIR, compact=True):
+    """Moves showtimes and deletions older than their horizons to the archive, then compacts the database."""
+    today = datetime.now(timezone.utc).date()
+    showtimes_cutoff = today - timedelta(days=keep_days)
+    deleted_cutoff = today - timedelta(days=keep_deleted_days)
+
+    archived_showtimes = db.archive_showtimes_before(
+        showtimes_cutoff.isoformat(),
+        lambda rows: _write_archive(archive_dir, "showtimes", "start_time", rows)
+    )
+    archived_deletions = db.archive_deleted_showtimes_before(
+        deleted_cutoff.isoformat(),
+        lambda rows: _write_archive(archive_dir, "deleted_showtimes", "delete_time", rows)
+    )
+    removed_snapshots = db.delete_snapshots_before(movie_week_start(showtimes_cutoff))
+    created_partitions = db.ensure_showtime_partitions()
+
+    if compact:
+        db.compact()
+
+    return {
+        "archived_showtimes": archived_showtimes,
+        "archived_deletions": archived_deletions,
+        "removed_snapshots": removed_snapshots,
+        "created_partitions": created_partitions
+    }
@@ -3,7 +3,7 @@ import re
 from datetime import date, datetime, timedelta
 
 from retriever.theaters import timezone
-from retriever.utils import offset_timezone
+from retriever.utils import normalize_title, offset_timezone
 
 
 RUNTIME_RE = re.compile(r"(?:(?P<hr>\d) hr)? ?(?:(?P<min>\d\d?) min)?")
@@ -57,13 +57,13 @@ def date_str_parser(value, *, tzname=None):
 def date_range_str_parser(value, *, tzname=None):
     tz = offset_timezone(tzname or SYSTEM_TZNAME)
     today = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
-    if value in MONTHS or value in MONTH_ABBRS:
-        monthno = MONTHS.index(value) if value in MONTHS else MONTH_ABBRS.index(value)
+    if value.lower() in MONTHS or value.lower() in MONTH_ABBRS:
+        monthno = MONTHS.index(value.lower()) if value.lower() in MONTHS else MONTH_ABBRS.index(value.lower())
         year = today.year + (0 if today.month <= monthno else 1)
         start_day = today.day if today.month == monthno else 1
-        start = datetime(year=year, month=monthno, day=start_day, tz=tz)
+        start = datetime(year=year, month=monthno, day=start_day, tzinfo=tz)
         end_day = calendar.monthrange(year, monthno)[1]
-        end = datetime(year=year, month=monthno, day=end_day, tz=tz)
+        end = datetime(year=year, month=monthno, day=end_day, tzinfo=tz)
     elif value.lower() == "movie week":
         start = today
         days_left = 6 if start.weekday() == PIVOT_DAY else ((PIVOT_DAY - start.weekday() - 1) % 7)
@@ -97,16 +97,16 @@ class Filter:
     def __init__(self, earliest_start, latest_start, movies, exclude_movies, fmts, exclude_fmts):
         self.earliest_start = earliest_start
         self.latest_start = latest_start
-        self.movies = [m.lower() for m in (movies or [])]
-        self.exclude_movies = [m.lower() for m in (exclude_movies or [])]
+        self.movies = {normalize_title(m) for m in (movies or [])}
+        self.exclude_movies = {normalize_title(m) for m in (exclude_movies or [])}
         self.fmts = fmts
         self.exclude_fmts = exclude_fmts
 
     def apply_movie_filter(self, name):
         if self.movies:
-            return name.lower() in self.movies
+            return normalize_title(name) in self.movies
         elif self.exclude_movies:
-            return name.lower() not in self.exclude_movies
+            return normalize_title(name) not in self.exclude_movies
         return True
 
     def apply_start_filter(self, start):
@@ -0,0 +1,133 @@
+import difflib
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from retriever import retention
+from retriever.movie_times_lib import collect_all_schedules
+from retriever.render import showtime_dicts
+from retriever.schedule import Filter, FullSchedule
+from retriever.snapshots import load_schedules_by_day_from_db
+from retriever.theaters import timezone
+from retriever.utils import normalize_title
+
+
+class ShowtimeIndex:
+    """Inverted index of showtimes across theaters, by title, format, date and theater."""
+
+    @staticmethod
+    def from_schedules(theaters_to_schedule):
+        index = ShowtimeIndex()
+        for theater, schedule in theaters_to_schedule.items():
+            for showtime in showtime_dicts(theater, schedule):
+                index.add(showtime)
+        return index
+
+    @staticmethod
+    def from_db(theaters, date_range, *, archive_dir=None):
+        """Indexes the stored showtimes, along with those retention archived to archive_dir, if given."""
+        theaters_to_schedule = {}
+        for theater in theaters:
+            schedules_by_day = load_schedules_by_day_from_db(theater, date_range, Filter.empty())
+            if schedules_by_day:
+                theaters_to_schedule[theater] = FullSchedule.create(schedules_by_day)
+        index = ShowtimeIndex.from_schedules(theaters_to_schedule)
+
+        if archive_dir:
+            for theater in theaters:
+                tz = timezone(theater)
+                # The last day is inclusive, but load_archived_showtimes is not.
+                first_time = datetime.combine(date_range[0].date(), time(), tz)
+                last_time = datetime.combine(date_range[1].date() + timedelta(days=1), time(), tz)
+                for showtime in retention.load_archived_showtimes(theater, first_time, last_time, archive_dir=archive_dir):
+                    index.add(showtime)
+        return index
+
+    @staticmethod
+    def from_live(theaters, date_range):
+        return ShowtimeIndex.from_schedules(collect_all_schedules(theaters, date_range, Filter.empty()))
+
+    def __init__(self):
+        self.showtimes = []
+        self._by_title = defaultdict(set)
+        self._by_format = defaultdict(set)
+        self._by_date = defaultdict(set)
+        self._by_theater = defaultdict(set)
+        self._display_titles = {}
+        self._title_suffixes = None
+
+    def add(self, showtime):
+        showtime_id = len(self.showtimes)
+        self.showtimes.append(showtime)
+
+        title_key = normalize_title(showtime["title"])
+        self._display_titles.setdefault(title_key, showtime["title"])
+        self._by_title[title_key].add(showtime_id)
+        self._by_format[showtime["format"].lower()].add(showtime_id)
+        self._by_date[datetime.fromisoformat(showtime["start_time"]).date()].add(showtime_id)
+        self._by_theater[showtime["theater"]].add(showtime_id)
+        self._title_suffixes = None
+
+    def __len__(self):
+        return len(self.showtimes)
+
+    def _suffixes(self):
+        # Every word-aligned tail of every title, so that a prefix search for
+        # "part two" also finds "dune part two".
+        if self._title_suffixes is None:
+            suffixes = []
+            for title_key in self._by_title:
+                words = title_key.split()
+                suffixes.extend((" ".join(words[start:]), title_key) for start in range(len(words)))
+            self._title_suffixes = sorted(suffixes)
+        return self._title_suffixes
+
+    def titles(self, query, *, prefix=False, fuzzy=False):
+        """Finds the normalized titles matching the query."""
+        query_key = normalize_title(query)
+        if query_key in self._by_title and not prefix:
+            return [query_key]
+
+        matches = set()
+        if prefix:
+            suffixes = self._suffixes()
+            position = bisect_left(suffixes, (query_key, ))
+            while position < len(suffixes) and suffixes[position][0].startswith(query_key):
+                matches.add(suffixes[position][1])
+                position += 1
+
+        if fuzzy and not matches:
+            matches.update(difflib.get_close_matches(query_key, self._by_title.keys(), n=5, cutoff=0.75))
+
+        return sorted(matches)
+
+    def display_title(self, title_key):
+        return self._display_titles[title_key]
+
+    def search(self, title=None, fmts=None, days=None, theaters=None, *, prefix=False, fuzzy=False):
+        """Returns the showtimes matching every given criterion, ordered by start time.
+
+        Each criterion other than title accepts several values, any one of
+        which may match.
+        """
+        def _union(postings, keys):
+            return set().union(*[postings.get(key, set()) for key in keys])
+
+        candidate_sets = []
+        if title:
+            candidate_sets.append(_union(self._by_title, self.titles(title, prefix=prefix, fuzzy=fuzzy)))
+        if fmts:
+            candidate_sets.append(_union(self._by_format, [fmt.lower() for fmt in fmts]))
+        if days:
+            candidate_sets.append(_union(self._by_date, days))
+        if theaters:
+            candidate_sets.append(_union(self._by_theater, theaters))
+
+        if candidate_sets:
+            # Intersect starting from the smallest set, to keep each step cheap.
+            candidate_sets.sort(key=len)
+            showtime_ids = candidate_sets[0].intersection(*candidate_sets[1:])
+        else:
+            showtime_ids = range(len(self.showtimes))
+
+        return sorted((self.showtimes[showtime_id] for showtime_id in showtime_ids), key=lambda s: (s["start_time"], s["theater"]))
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from retriever import db
+from retriever.render import render_ics, render_plaintext
+from retriever.schedule import PIVOT_DAY, DaySchedule, Filter, FullSchedule, Movie, Showing
+from retriever.theaters import timezone
+
+
+def _day_bounds(theater, first_day, last_day):
+    tz = timezone(theater)
+    # The last day is inclusive, but load_showtimes is not.
+    return (datetime.combine(first_day, time(), tz), datetime.combine(last_day + timedelta(days=1), time(), tz))
+
+def _dates(date_range):
+    return tuple(day.date() if isinstance(day, datetime) else day for day in date_range)
+
+def movie_week_start(day):
+    return day - timedelta(days=(day.weekday() - PIVOT_DAY) % 7)
+
+def _movie_weeks(first_day, last_day):
+    week_start = movie_week_start(first_day)
+    while week_start <= last_day:
+        yield week_start
+        week_start += timedelta(days=7)
+
+
+def _schedules_by_day_from_rows(rows):
+    day_to_movies = defaultdict(dict)
+    for row in rows:
+        start = datetime.fromisoformat(row["start_time"])
+        end = datetime.fromisoformat(row["end_time"])
+
+        movies = day_to_movies[start.date()]
+        if row["title"] not in movies:
+            runtime_min = int((end - start).total_seconds() // 60)
+            movies[row["title"]] = Movie(row["title"], runtime_min)
+
+        # Languages aren't stored, so they can't be restored.
+        movies[row["title"]].showings.append(
+            Showing(row["format"], [], row["is_open_caption"], row["no_alist"], start, end)
+        )
+
+    schedules_by_day = []
+    for day, movies in sorted(day_to_movies.items()):
+        schedule = DaySchedule(day)
+        schedule.movies.extend(movies.values())
+        schedules_by_day.append(schedule)
+    return schedules_by_day
+
+def load_schedules_by_day_from_db(theater, date_range, filter_params):
+    rows = db.load_showtimes(theater, *_day_bounds(theater, *_dates(date_range)))
+    return [schedule.filter(filter_params) for schedule in _schedules_by_day_from_rows(rows)]
+
+
+def _render_week(theater, week_start):
+    schedules_by_day = load_schedules_by_day_from_db(theater, (week_start, week_start + timedelta(days=6)), Filter.empty())
+    if not schedules_by_day:
+        return None
+
+    schedule = FullSchedule.create(schedules_by_day)
+    return render_plaintext(schedule), render_ics(schedule)
+
+def _refresh_snapshot(theater, week_start, snapshot=None):
+    fingerprint = db.showtimes_fingerprint(theater, *_day_bounds(theater, week_start, week_start + timedelta(days=6)))
+    if snapshot and snapshot["fingerprint"] == fingerprint:
+        return snapshot["plaintext"], snapshot["ics"]
+
+    rendered = _render_week(theater, week_start)
+    if rendered:
+        db.store_snapshot(theater, week_start, fingerprint, *rendered)
+    return rendered
+
+def refresh_snapshots(theaters, date_range):
+    """Re-renders the snapshot of every movie week touched by the date range, if its showtimes changed."""
+    first_day, last_day = _dates(date_range)
+    for theater in theaters:
+        for week_start in _movie_weeks(first_day, last_day):
+            _refresh_snapshot(theater, week_start, db.load_snapshot(theater, week_start))
+
+def load_rendered_schedule(theater, date_range):
+    """Returns the plaintext and ICS renderings of the stored schedule, or None if there is none.
+
+    A date range covering exactly one movie week is served from its snapshot,
+    which is refreshed first if the stored showtimes have since changed.
+    """
+    first_day, last_day = _dates(date_range)
+    week_start = movie_week_start(first_day)
+    if week_start == first_day and last_day == week_start + timedelta(days=6):
+        return _refresh_snapshot(theater, week_start, db.load_snapshot(theater, week_start))
+
+    schedules_by_day = load_schedules_by_day_from_db(theater, (first_day, last_day), Filter.empty())
+    if not schedules_by_day:
+        return None
+
+    schedule = FullSchedule.create(schedules_by_day)
+    return render_plaintext(schedule), render_ics(schedule)
@@ -1,3 +1,5 @@
+import re
+import unicodedata
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
@@ -11,3 +13,40 @@ def offset_timezone(tzname):
     """
     now = datetime.now(ZoneInfo(tzname))
     return timezone(now.tzinfo.utcoffset(now), tzname)
+
+
+YEAR_SUFFIX_RE = re.compile(r"\s*\(\d{4}\)$")
+FORMAT_SUFFIX_RE = re.compile(
+    # The format must follow a separator or bracket, so that it isn't cut
+    # from the end of a word like "Climax".
+    r"(?:[\s:\-]+[\(\[]?|[\(\[])(?:in\s+)?(?:(?:an?|the)\s+)?"
+    r"(?:imax|dolby(?: cinema)?|(?:real ?d|digital) 3d|3d|2d|4dx|screenx|d-box)"
+    r"(?:\s+(?:2d|3d))?(?:\s+experience)?[\)\]]?$"
+)
+NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+def normalize_title(title):
+    """Reduces a movie title to a key shared by its listings across theaters.
+
+    Case, accents and punctuation are dropped, as are a trailing release year
+    and any trailing format variant (e.g. "in 3D", ": The IMAX Experience").
+
+    >>> normalize_title("Dune: Part Two (2024): The IMAX Experience")
+    'dune part two'
+    >>> normalize_title("Avatar in 3D")
+    'avatar'
+    >>> normalize_title("Climax")
+    'climax'
+    >>> normalize_title("Maximax (2010)")
+    'maximax'
+    """
+    title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii")
+    title = title.lower().strip().replace("&", " and ")
+
+    previous = None
+    while title != previous:
+        previous = title
+        title = YEAR_SUFFIX_RE.sub("", title)
+        title = FORMAT_SUFFIX_RE.sub("", title).strip()
+
+    return NON_WORD_RE.sub(" ", title).strip()